@@ -6,6 +6,21 @@ from datetime import datetime
 import altair as alt
 import io
 import base64
+import gzip
+import hashlib
+import os
+import random
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from collections import deque
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin turno entre procesos para los snapshots
+    fcntl = None
 
 # Configuración de la página
 st.set_page_config(
@@ -15,35 +30,219 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Reintentos ante errores "database is locked" / "database is busy"
+MAX_REINTENTOS = 6
+BACKOFF_BASE = 0.02  # segundos, se duplica en cada reintento
+BACKOFF_MAXIMO = 1.0
+TIMEOUT_CONEXION = 2.0  # espera interna de SQLite antes de devolver SQLITE_BUSY
+
+# Versión del esquema guardada en PRAGMA user_version: incrementarla al cambiar
+# tablas, índices o triggers para que las bases existentes se actualicen
+VERSION_ESQUEMA = 1
+
+# Alertas ya procesadas que se conservan (obtener_alertas_recientes solo muestra las últimas)
+DIAS_RETENCION_ALERTAS = 30
+
+# Respaldos en línea (RespaldoManager / RespaldoScheduler)
+DIRECTORIO_RESPALDOS = 'respaldos'
+INTERVALO_RESPALDO = 6 * 3600  # segundos entre snapshots automáticos
+RESPALDOS_A_CONSERVAR = 7
+REINTENTO_RESPALDO = 600  # segundos antes de reintentar un snapshot automático fallido
+PAGINAS_POR_PASO = 64  # ~256 KB por paso con páginas de 4 KB
+PAUSA_ENTRE_PASOS = 0.005  # pausa mínima cedida a los escritores entre pasos
+PAUSA_MAXIMA = 0.5  # tope de la pausa cuando los escritores se ralentizan
+CICLO_RESPALDO = 0.5  # fracción máxima del tiempo en que la copia ocupa la E/S
+TOLERANCIA_LATENCIA = 1.5  # p95 de escritura admitido respecto al previo a la copia
+LATENCIA_OBJETIVO_MINIMA = 0.02  # segundos; p95 de escritura que nunca frena la copia
+VENTANA_LATENCIA = 60  # segundos de latencias de escritura que se conservan
+VENTANA_LATENCIA_RECIENTE = 2  # segundos observados durante la copia
+VIGENCIA_MARCA_RESPALDO = 30  # segundos sin renovar tras los que la marca de respaldo se ignora
+TAMANO_BLOQUE = 1024 * 1024
+NIVEL_COMPRESION = 6  # el 9 por defecto de gzip apenas reduce más y tarda bastante más
+PRIORIDAD_COMPRESION = 10  # nice del proceso que comprime
+NOMBRE_EN_SNAPSHOT = 'inventario.db'
+ARCHIVO_TURNO_SNAPSHOT = '.snapshot.lock'  # en el directorio de respaldos, compartido por las réplicas
+RUTA_COMPRESION = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'compresion.py')
+
+# Expresión SQL que clasifica el estado de stock de una fila de productos
+ESTADO_STOCK_SQL = '''
+    CASE
+        WHEN {t}.stock = 0 THEN 'SIN_STOCK'
+        WHEN {t}.stock <= {t}.stock_minimo THEN 'STOCK_BAJO'
+        ELSE 'STOCK_OK'
+    END
+'''
+
+# Tipos de medida con id fijo; UNIDAD (1) es el valor por defecto
+TIPOS_MEDIDA = [
+    (1, 'UNIDAD', 'unid'),
+    (2, 'KILO', 'kg'),
+    (3, 'LITRO', 'lt'),
+    (4, 'METRO', 'm'),
+]
+
+# Esquema de productos; {tabla} permite reconstruirla durante la migración
+SQL_TABLA_PRODUCTOS = """
+    CREATE TABLE IF NOT EXISTS {tabla} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        nombre TEXT NOT NULL,
+        categoria_id INTEGER,
+        stock INTEGER NOT NULL DEFAULT 0,
+        stock_minimo INTEGER NOT NULL DEFAULT 0,
+        precio_compra REAL DEFAULT 0,
+        precio_venta REAL DEFAULT 0,
+        tipo_medida_id INTEGER NOT NULL DEFAULT 1,
+        ubicacion_id INTEGER,
+        activo BOOLEAN DEFAULT 1,
+        fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (categoria_id) REFERENCES categorias (id),
+        FOREIGN KEY (tipo_medida_id) REFERENCES tipos_medida (id),
+        FOREIGN KEY (ubicacion_id) REFERENCES ubicaciones (id)
+    )
+"""
+
+# Reposición sugerida para un producto crítico p: llevarlo al doble del mínimo
+SQL_CANTIDAD_SUGERIDA = "MAX(p.stock_minimo * 2 - p.stock, 1)"
+
+# Alta de producto: categoría, medida y ubicación se traducen a sus ids de catálogo
+# (registrar_catalogos debe darlas de alta antes; sin medida se usa UNIDAD)
+SQL_INSERTAR_PRODUCTO = """
+    INSERT INTO productos (nombre, categoria_id, stock, stock_minimo,
+                           precio_compra, precio_venta, tipo_medida_id, ubicacion_id)
+    VALUES (?, (SELECT id FROM categorias WHERE nombre = ?), ?, ?, ?, ?,
+            COALESCE((SELECT id FROM tipos_medida WHERE codigo = ?), 1),
+            (SELECT id FROM ubicaciones WHERE nombre = ?))
+"""
+
+# Inserción en el historial de movimientos
+SQL_INSERTAR_MOVIMIENTO = """
+    INSERT INTO movimientos (tipo, producto_id, cantidad, motivo)
+    VALUES (?, ?, ?, ?)
+"""
+
 # Título principal
 st.title("📦 Sistema de Inventario en la Nube")
 st.markdown("---")
 
+def es_error_bloqueo(error):
+    """Indica si el error de SQLite se debe a contención y vale la pena reintentar"""
+    if not isinstance(error, sqlite3.OperationalError):
+        return False
+    mensaje = str(error).lower()
+    return 'locked' in mensaje or 'busy' in mensaje
+
+def reintentar_si_bloqueada(operacion, estadisticas=None):
+    """Ejecuta operacion() reintentando con backoff exponencial si la base está bloqueada"""
+    for intento in range(MAX_REINTENTOS + 1):
+        inicio = time.perf_counter()
+        try:
+            return operacion()
+        except sqlite3.OperationalError as e:
+            if not es_error_bloqueo(e):
+                raise
+            if intento == MAX_REINTENTOS:
+                if estadisticas is not None:
+                    estadisticas['fallos'] += 1
+                raise
+            # Jitter completo para que los procesos en conflicto no se sincronicen
+            time.sleep(random.uniform(0, min(BACKOFF_MAXIMO, BACKOFF_BASE * 2 ** intento)))
+            if estadisticas is not None:
+                estadisticas['reintentos'] += 1
+                estadisticas['espera'] += time.perf_counter() - inicio
+
+def registrar_catalogos(cursor, categoria, ubicacion, tipo_medida=None):
+    """Da de alta en sus tablas de catálogo la categoría, ubicación y medida si no existen"""
+    if categoria:
+        cursor.execute("INSERT OR IGNORE INTO categorias (nombre) VALUES (?)", (categoria,))
+    if ubicacion:
+        cursor.execute("INSERT OR IGNORE INTO ubicaciones (nombre) VALUES (?)", (ubicacion,))
+    if tipo_medida:
+        # Igual que la migración: códigos desconocidos se conservan y se muestran como 'unid'
+        cursor.execute(
+            "INSERT OR IGNORE INTO tipos_medida (codigo, display) VALUES (?, 'unid')", (tipo_medida,)
+        )
+
+class MonitorLatencia:
+    """Latencias recientes de las escrituras del proceso, compartido entre hilos"""
+
+    def __init__(self, ventana=VENTANA_LATENCIA):
+        self.ventana = ventana
+        self._muestras = deque()
+        self._lock = threading.Lock()
+
+    def registrar(self, latencia):
+        ahora = time.monotonic()
+        with self._lock:
+            self._muestras.append((ahora, latencia))
+            while self._muestras[0][0] < ahora - self.ventana:
+                self._muestras.popleft()
+
+    def percentil(self, p, ultimos_segundos=None):
+        """Percentil p (0-100) de las latencias registradas; None si no hay muestras"""
+        desde = time.monotonic() - (ultimos_segundos or self.ventana)
+        with self._lock:
+            valores = sorted(latencia for instante, latencia in self._muestras if instante >= desde)
+        if not valores:
+            return None
+        return valores[max(0, min(len(valores) - 1, round(p / 100 * len(valores)) - 1))]
+
 class DatabaseManager:
-    def __init__(self):
+    def __init__(self, db_path='inventario.db'):
+        self.db_path = db_path
+        # La renueva RespaldoManager mientras copia; visible para todas las réplicas
+        self.marca_respaldo = db_path + '.respaldo'
+        self.esquema_listo = False
+        # Latencias de escritura del proceso: las consulta RespaldoManager para dosificar la copia
+        self.latencias_escritura = MonitorLatencia()
         self.init_database()
     
     def init_database(self):
         """Inicializa la base de datos SQLite"""
+        if self.esquema_listo:
+            return
+        try:
+            # Base ya al día: solo una lectura, sin competir por el bloqueo de escritura
+            if self.version_esquema() != VERSION_ESQUEMA:
+                reintentar_si_bloqueada(self._crear_esquema)
+            self.esquema_listo = True
+        except Exception as e:
+            st.error(f"❌ Error inicializando base de datos: {e}")
+
+    def version_esquema(self):
+        conn = self.get_connection()
+        try:
+            return conn.execute("PRAGMA user_version").fetchone()[0]
+        finally:
+            conn.close()
+
+    def _crear_esquema(self):
+        conn = self.get_connection()
+        migrado = False
         try:
-            conn = sqlite3.connect('inventario.db', check_same_thread=False)
             cursor = conn.cursor()
+
+            # WAL: los lectores no bloquean a los escritores entre procesos
+            cursor.execute("PRAGMA journal_mode=WAL")
+            # Una sola transacción: réplicas que arrancan a la vez no duplican datos de ejemplo
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute("PRAGMA user_version")
+            if cursor.fetchone()[0] == VERSION_ESQUEMA:
+                # Otra réplica terminó la inicialización mientras esperábamos
+                conn.rollback()
+                return
+            
+            # Catálogos de categorías, tipos de medida y ubicaciones
+            self.init_catalogos(cursor)
             
             # Tabla de productos
+            cursor.execute(SQL_TABLA_PRODUCTOS.format(tabla='productos'))
+            
+            # Bases anteriores guardaban los catálogos como texto en cada fila
+            migrado = self.migrar_catalogos(cursor)
+            
             cursor.execute('''
-                CREATE TABLE IF NOT EXISTS productos (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    nombre TEXT NOT NULL,
-                    categoria TEXT,
-                    stock INTEGER NOT NULL DEFAULT 0,
-                    stock_minimo INTEGER NOT NULL DEFAULT 0,
-                    precio_compra REAL DEFAULT 0,
-                    precio_venta REAL DEFAULT 0,
-                    tipo_medida TEXT DEFAULT 'UNIDAD',
-                    ubicacion TEXT,
-                    activo BOOLEAN DEFAULT 1,
-                    fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
+                CREATE INDEX IF NOT EXISTS idx_productos_categoria
+                ON productos (categoria_id)
             ''')
             
             # Tabla de movimientos
@@ -78,7 +277,10 @@ class DatabaseManager:
                 INSERT OR IGNORE INTO usuarios (usuario, password, nombre, rol) 
                 VALUES ('admin', 'admin', 'Administrador', 'ADMIN')
             ''')
-            
+
+            # Cola de alertas de stock y productos críticos
+            self.init_alertas_stock(cursor)
+
             # Verificar si hay productos de ejemplo
             cursor.execute("SELECT COUNT(*) FROM productos")
             count = cursor.fetchone()[0]
@@ -98,91 +300,725 @@ class DatabaseManager:
                     ('Detergente', 'Limpieza', 18, 5, 3200, 4800, 'LITRO', 'Estante E-2')
                 ]
                 
-                cursor.executemany('''
-                    INSERT INTO productos 
-                    (nombre, categoria, stock, stock_minimo, precio_compra, precio_venta, tipo_medida, ubicacion) 
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                ''', productos_ejemplo)
+                for producto in productos_ejemplo:
+                    registrar_catalogos(cursor, producto[1], producto[7], producto[6])
+                cursor.executemany(SQL_INSERTAR_PRODUCTO, productos_ejemplo)
             
+            cursor.execute(f"PRAGMA user_version = {VERSION_ESQUEMA}")
             conn.commit()
-            conn.close()
             
-        except Exception as e:
-            st.error(f"❌ Error inicializando base de datos: {e}")
-    
+            if migrado:
+                # Recuperar el espacio de las columnas de texto eliminadas
+                conn.execute("VACUUM")
+        finally:
+            conn.close()
+
+    def init_catalogos(self, cursor):
+        """Crea las tablas de catálogo referenciadas por productos"""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS categorias (
+                id INTEGER PRIMARY KEY,
+                nombre TEXT UNIQUE NOT NULL
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS tipos_medida (
+                id INTEGER PRIMARY KEY,
+                codigo TEXT UNIQUE NOT NULL,
+                display TEXT NOT NULL
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS ubicaciones (
+                id INTEGER PRIMARY KEY,
+                nombre TEXT UNIQUE NOT NULL
+            )
+        ''')
+        cursor.executemany(
+            "INSERT OR IGNORE INTO tipos_medida (id, codigo, display) VALUES (?, ?, ?)",
+            TIPOS_MEDIDA
+        )
+
+    def migrar_catalogos(self, cursor):
+        """Convierte productos con categoria/tipo_medida/ubicacion en texto a ids de catálogo.
+        
+        Devuelve True si la tabla tuvo que migrarse.
+        """
+        cursor.execute("PRAGMA table_info(productos)")
+        columnas = [columna[1] for columna in cursor.fetchall()]
+        if 'categoria' not in columnas:
+            return False
+        
+        cursor.execute('''
+            INSERT OR IGNORE INTO categorias (nombre)
+            SELECT DISTINCT categoria FROM productos
+            WHERE categoria IS NOT NULL AND categoria != ''
+        ''')
+        cursor.execute('''
+            INSERT OR IGNORE INTO ubicaciones (nombre)
+            SELECT DISTINCT ubicacion FROM productos
+            WHERE ubicacion IS NOT NULL AND ubicacion != ''
+        ''')
+        # Medidas desconocidas se conservan, mostrándose como 'unid' igual que antes
+        cursor.execute('''
+            INSERT OR IGNORE INTO tipos_medida (codigo, display)
+            SELECT DISTINCT tipo_medida, 'unid' FROM productos
+            WHERE tipo_medida IS NOT NULL AND tipo_medida != ''
+        ''')
+        
+        # SQLite no elimina columnas con ALTER TABLE: se reconstruye la tabla
+        cursor.execute(SQL_TABLA_PRODUCTOS.format(tabla='productos_nuevo'))
+        cursor.execute('''
+            INSERT INTO productos_nuevo
+                (id, nombre, categoria_id, stock, stock_minimo, precio_compra, precio_venta,
+                 tipo_medida_id, ubicacion_id, activo, fecha_creacion)
+            SELECT p.id, p.nombre, c.id, p.stock, p.stock_minimo, p.precio_compra, p.precio_venta,
+                   COALESCE(t.id, 1), u.id, p.activo, p.fecha_creacion
+            FROM productos p
+            LEFT JOIN categorias c ON c.nombre = p.categoria
+            LEFT JOIN tipos_medida t ON t.codigo = p.tipo_medida
+            LEFT JOIN ubicaciones u ON u.nombre = p.ubicacion
+        ''')
+        # AUTOINCREMENT: no reutilizar ids de productos borrados antes de migrar
+        cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'productos'")
+        secuencia = cursor.fetchone()
+        # Los triggers de alertas se eliminan con la tabla y se recrean después
+        cursor.execute("DROP TABLE productos")
+        cursor.execute("ALTER TABLE productos_nuevo RENAME TO productos")
+        if secuencia:
+            cursor.execute(
+                "UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'productos'", secuencia
+            )
+            if cursor.rowcount == 0:
+                # Tabla vacía: la copia no llegó a crear su fila en sqlite_sequence
+                cursor.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('productos', ?)", secuencia)
+        return True
+
+    def init_alertas_stock(self, cursor):
+        """Crea la cola de alertas y los triggers que registran cruces de umbral"""
+        # Cada fila es un cruce de umbral (cambio de estado_stock) de un producto
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS alertas_stock (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                producto_id INTEGER NOT NULL,
+                estado_anterior TEXT,
+                estado_nuevo TEXT NOT NULL,
+                stock INTEGER NOT NULL,
+                stock_minimo INTEGER NOT NULL,
+                procesada BOOLEAN DEFAULT 0,
+                fecha TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (producto_id) REFERENCES productos (id)
+            )
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_alertas_stock_pendientes
+            ON alertas_stock (procesada, id)
+        ''')
+
+        # Productos actualmente críticos, mantenida por los triggers
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS productos_criticos (
+                producto_id INTEGER PRIMARY KEY,
+                estado TEXT NOT NULL CHECK(estado IN ('SIN_STOCK', 'STOCK_BAJO')),
+                desde TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (producto_id) REFERENCES productos (id)
+            )
+        ''')
+
+        # Sugerencias de reposición consolidadas por AlertasWorker
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS sugerencias_reposicion (
+                producto_id INTEGER PRIMARY KEY,
+                estado TEXT NOT NULL,
+                cantidad_sugerida INTEGER NOT NULL,
+                alertas INTEGER NOT NULL DEFAULT 0,
+                primera_alerta TIMESTAMP,
+                ultima_alerta TIMESTAMP,
+                fecha_actualizacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (producto_id) REFERENCES productos (id)
+            )
+        ''')
+
+        cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'trg_alerta_stock_update'"
+        )
+        triggers_existentes = cursor.fetchone() is not None
+
+        estado_old = ESTADO_STOCK_SQL.format(t='OLD')
+        estado_new = ESTADO_STOCK_SQL.format(t='NEW')
+
+        # Se recrean siempre para que las bases existentes reciban la versión actual
+        for trigger in ('trg_alerta_stock_insert', 'trg_alerta_stock_update', 'trg_alerta_stock_baja'):
+            cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+
+        # Pasar de STOCK_BAJO a SIN_STOCK (o al revés) solo cambia el estado:
+        # desde conserva el momento en que el producto se volvió crítico
+        cursor.execute(f'''
+            CREATE TRIGGER trg_alerta_stock_insert
+            AFTER INSERT ON productos
+            WHEN NEW.activo = 1 AND NEW.stock <= NEW.stock_minimo
+            BEGIN
+                INSERT INTO alertas_stock (producto_id, estado_anterior, estado_nuevo, stock, stock_minimo)
+                VALUES (NEW.id, NULL, {estado_new}, NEW.stock, NEW.stock_minimo);
+                INSERT INTO productos_criticos (producto_id, estado)
+                VALUES (NEW.id, {estado_new})
+                ON CONFLICT(producto_id) DO UPDATE SET estado = excluded.estado;
+            END
+        ''')
+
+        cursor.execute(f'''
+            CREATE TRIGGER trg_alerta_stock_update
+            AFTER UPDATE OF stock, stock_minimo ON productos
+            WHEN NEW.activo = 1 AND {estado_old} != {estado_new}
+            BEGIN
+                INSERT INTO alertas_stock (producto_id, estado_anterior, estado_nuevo, stock, stock_minimo)
+                VALUES (NEW.id, {estado_old}, {estado_new}, NEW.stock, NEW.stock_minimo);
+                DELETE FROM productos_criticos
+                WHERE producto_id = NEW.id AND {estado_new} = 'STOCK_OK';
+                INSERT INTO productos_criticos (producto_id, estado)
+                SELECT NEW.id, {estado_new} WHERE {estado_new} != 'STOCK_OK'
+                ON CONFLICT(producto_id) DO UPDATE SET estado = excluded.estado;
+            END
+        ''')
+
+        # Un producto desactivado deja de ser crítico
+        cursor.execute('''
+            CREATE TRIGGER trg_alerta_stock_baja
+            AFTER UPDATE OF activo ON productos
+            WHEN NEW.activo = 0 AND OLD.activo = 1
+            BEGIN
+                DELETE FROM productos_criticos WHERE producto_id = NEW.id;
+                DELETE FROM sugerencias_reposicion WHERE producto_id = NEW.id;
+            END
+        ''')
+
+        if not triggers_existentes:
+            # Primera vez: sembrar los productos críticos que ya existían, dejando
+            # constancia en la cola para que AlertasWorker genere su sugerencia
+            estado = ESTADO_STOCK_SQL.format(t='p')
+            cursor.execute(f'''
+                INSERT INTO alertas_stock (producto_id, estado_anterior, estado_nuevo, stock, stock_minimo)
+                SELECT p.id, NULL, {estado}, p.stock, p.stock_minimo
+                FROM productos p
+                WHERE p.activo = 1 AND p.stock <= p.stock_minimo
+                  AND p.id NOT IN (SELECT producto_id FROM productos_criticos)
+            ''')
+            cursor.execute(f'''
+                INSERT OR IGNORE INTO productos_criticos (producto_id, estado)
+                SELECT p.id, {estado}
+                FROM productos p
+                WHERE p.activo = 1 AND p.stock <= p.stock_minimo
+            ''')
+
+    def respaldo_en_curso(self):
+        try:
+            return time.time() - os.path.getmtime(self.marca_respaldo) < VIGENCIA_MARCA_RESPALDO
+        except FileNotFoundError:
+            return False
+
     def get_connection(self):
-        return sqlite3.connect('inventario.db', check_same_thread=False)
+        conn = sqlite3.connect(self.db_path, timeout=TIMEOUT_CONEXION, check_same_thread=False)
+        if self.respaldo_en_curso():
+            # La instantánea fijada por el respaldo impide que el checkpoint avance:
+            # intentarlo en cada commit solo suma fsyncs a los escritores
+            conn.execute("PRAGMA wal_autocheckpoint=0")
+        return conn
+
+class AlertasWorker(threading.Thread):
+    """Consolida en segundo plano la cola de alertas en sugerencias de reposición"""
+
+    def __init__(self, db_manager, intervalo=5):
+        super().__init__(name="alertas-worker", daemon=True)
+        self.db = db_manager
+        self.intervalo = intervalo
+        self._detener = threading.Event()
+
+    def run(self):
+        while not self._detener.wait(self.intervalo):
+            try:
+                self.procesar_alertas()
+            except sqlite3.Error:
+                # Base ocupada o no disponible: se reintenta en el siguiente ciclo
+                pass
+
+    def detener(self):
+        self._detener.set()
+
+    def procesar_alertas(self):
+        """Procesa las alertas pendientes y refresca las sugerencias desactualizadas.
+        
+        Devuelve cuántas alertas se consolidaron.
+        """
+        conn = self.db.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT MAX(id), COUNT(*) FROM alertas_stock WHERE procesada = 0")
+            ultima_alerta, pendientes = cursor.fetchone()
+
+            # Sugerencias que faltan o cuyo stock cambió sin cruzar un umbral
+            cursor.execute(f'''
+                SELECT COUNT(*)
+                FROM productos_criticos c
+                JOIN productos p ON p.id = c.producto_id
+                LEFT JOIN sugerencias_reposicion s ON s.producto_id = c.producto_id
+                WHERE s.producto_id IS NULL
+                   OR s.estado != c.estado
+                   OR s.cantidad_sugerida != {SQL_CANTIDAD_SUGERIDA}
+            ''')
+            desactualizadas = cursor.fetchone()[0]
+            if not pendientes and not desactualizadas:
+                return 0
+            ultima_alerta = ultima_alerta or 0
+
+            # Todos los productos críticos: crear o refrescar su sugerencia,
+            # acumulando las alertas nuevas de cada uno
+            cursor.execute(f'''
+                INSERT INTO sugerencias_reposicion
+                    (producto_id, estado, cantidad_sugerida, alertas,
+                     primera_alerta, ultima_alerta, fecha_actualizacion)
+                SELECT c.producto_id, c.estado,
+                       {SQL_CANTIDAD_SUGERIDA},
+                       COALESCE(a.alertas, 0),
+                       COALESCE(a.primera, c.desde),
+                       COALESCE(a.ultima, c.desde),
+                       CURRENT_TIMESTAMP
+                FROM productos_criticos c
+                JOIN productos p ON p.id = c.producto_id
+                LEFT JOIN (
+                    SELECT producto_id, COUNT(*) AS alertas,
+                           MIN(fecha) AS primera, MAX(fecha) AS ultima
+                    FROM alertas_stock
+                    WHERE procesada = 0 AND id <= ?
+                    GROUP BY producto_id
+                ) a ON a.producto_id = c.producto_id
+                WHERE 1
+                ON CONFLICT(producto_id) DO UPDATE SET
+                    estado = excluded.estado,
+                    cantidad_sugerida = excluded.cantidad_sugerida,
+                    alertas = alertas + excluded.alertas,
+                    ultima_alerta = CASE WHEN excluded.alertas > 0
+                                         THEN excluded.ultima_alerta ELSE ultima_alerta END,
+                    fecha_actualizacion = excluded.fecha_actualizacion
+            ''', (ultima_alerta,))
+
+            # Productos que ya no son críticos: su sugerencia ya no aplica
+            cursor.execute('''
+                DELETE FROM sugerencias_reposicion
+                WHERE producto_id NOT IN (SELECT producto_id FROM productos_criticos)
+            ''')
+
+            cursor.execute(
+                "UPDATE alertas_stock SET procesada = 1 WHERE procesada = 0 AND id <= ?",
+                (ultima_alerta,)
+            )
+
+            # La cola no crece sin límite: se descartan las procesadas antiguas
+            cursor.execute(
+                "DELETE FROM alertas_stock WHERE procesada = 1 AND fecha < datetime('now', ?)",
+                (f"-{DIAS_RETENCION_ALERTAS} days",)
+            )
+            conn.commit()
+            return pendientes
+        finally:
+            conn.close()
+
+class _RitmoRespaldo:
+    """Pausa entre pasos de la copia según su duración y la latencia de los escritores.
+
+    Tras cada paso se cede al menos el tiempo que éste tardó (CICLO_RESPALDO);
+    si el p95 reciente de las escrituras del proceso supera el objetivo, la
+    pausa se duplica hasta PAUSA_MAXIMA y vuelve a bajar cuando se recuperan.
+    """
+
+    def __init__(self, pausa_minima, monitor):
+        self.pausa_minima = pausa_minima
+        self.monitor = monitor
+        # Objetivo relativo a la latencia previa a la copia, con un mínimo
+        # para no frenarla por variaciones de décimas de milisegundo
+        previa = monitor.percentil(95)
+        self.objetivo = max((previa or 0) * TOLERANCIA_LATENCIA, LATENCIA_OBJETIVO_MINIMA)
+        self.factor = 1
+        self.fin_pausa = time.perf_counter()
+
+    def pausa(self):
+        duracion_paso = time.perf_counter() - self.fin_pausa
+        reciente = self.monitor.percentil(95, VENTANA_LATENCIA_RECIENTE)
+        if reciente is not None and reciente > self.objetivo:
+            self.factor = min(self.factor * 2, 64)
+        else:
+            self.factor = max(self.factor // 2, 1)
+        base = max(self.pausa_minima, duracion_paso * (1 - CICLO_RESPALDO) / CICLO_RESPALDO)
+        pausa = min(base * self.factor, PAUSA_MAXIMA)
+        time.sleep(pausa)
+        self.fin_pausa = time.perf_counter()
+        return pausa
+
+class RespaldoManager:
+    """Respaldos en línea de la base con la API de backup incremental de SQLite"""
+
+    def __init__(self, db_manager, directorio=DIRECTORIO_RESPALDOS,
+                 paginas_por_paso=PAGINAS_POR_PASO, pausa=PAUSA_ENTRE_PASOS,
+                 conservar=RESPALDOS_A_CONSERVAR):
+        self.db = db_manager
+        self.directorio = directorio
+        self.paginas_por_paso = paginas_por_paso
+        self.pausa = pausa
+        self.conservar = conservar
+
+    def respaldar(self, destino):
+        """Copia la base a destino unas pocas páginas por paso, sin bloquear escritores"""
+        origen = self.db.get_connection()
+        origen.isolation_level = None
+        copia = sqlite3.connect(destino)
+        try:
+            # Fijar una instantánea de lectura: en WAL no bloquea a los escritores
+            # y evita que la copia se reinicie cada vez que otra conexión escribe
+            origen.execute("BEGIN")
+            origen.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+
+            ritmo = _RitmoRespaldo(self.pausa, self.db.latencias_escritura)
+
+            def progreso(estado, restantes, total):
+                self._marcar_respaldo()
+                # sqlite3 solo duerme entre pasos si la base está ocupada:
+                # la pausa entre pasos la impone este callback
+                if restantes and self.pausa:
+                    ritmo.pausa()
+
+            try:
+                self._marcar_respaldo()
+                origen.backup(copia, pages=self.paginas_por_paso, progress=progreso)
+                origen.execute("COMMIT")
+            finally:
+                try:
+                    os.remove(self.db.marca_respaldo)
+                except FileNotFoundError:
+                    pass
+
+            # El WAL creció mientras la instantánea estuvo fijada: se vuelca aquí
+            # para que no sea el commit de un escritor quien pague el checkpoint
+            origen.execute("PRAGMA wal_checkpoint(PASSIVE)")
+        finally:
+            copia.close()
+            origen.close()
+
+    def _marcar_respaldo(self):
+        """Crea o renueva la marca que suspende el autocheckpoint de los escritores"""
+        with open(self.db.marca_respaldo, 'a'):
+            pass
+        os.utime(self.db.marca_respaldo)
+
+    def _tomar_turno(self):
+        """Archivo de turno bloqueado en exclusiva; None si otro snapshot está en curso.
+
+        flock es por archivo abierto: excluye tanto a otras réplicas como a otro
+        hilo del mismo proceso, y el sistema lo libera si el proceso muere, así
+        que un snapshot interrumpido nunca deja el turno tomado.
+        """
+        os.makedirs(self.directorio, exist_ok=True)
+        turno = open(os.path.join(self.directorio, ARCHIVO_TURNO_SNAPSHOT), 'a')
+        if fcntl is not None:
+            try:
+                fcntl.flock(turno, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                turno.close()
+                return None
+        return turno
+
+    def crear_snapshot(self, intervalo=None):
+        """Crea un snapshot comprimido y con checksum; devuelve su ruta.
+
+        Devuelve None sin hacer nada si otro snapshot está en curso o, con
+        intervalo, si ya existe uno con menos de intervalo segundos.
+        """
+        turno = self._tomar_turno()
+        if turno is None:
+            return None
+        try:
+            edad = self.edad_ultimo_snapshot()
+            if intervalo is not None and edad is not None and edad < intervalo:
+                return None
+            return self._crear_snapshot()
+        finally:
+            turno.close()
+
+    def _crear_snapshot(self):
+        nombre = f"inventario_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.db.gz"
+        ruta = os.path.join(self.directorio, nombre)
+        temporal_db = ruta + '.db.tmp'
+        temporal_gz = ruta + '.tmp'
+
+        try:
+            self.respaldar(temporal_db)
+
+            # gzip y SHA-256 en un proceso aparte con menor prioridad: no compiten
+            # por CPU ni por el GIL con las sesiones que atiende este proceso
+            resultado = subprocess.run(
+                [sys.executable, RUTA_COMPRESION, temporal_db, temporal_gz, NOMBRE_EN_SNAPSHOT,
+                 str(NIVEL_COMPRESION), str(self.pausa), str(PRIORIDAD_COMPRESION)],
+                capture_output=True, text=True
+            )
+            if resultado.returncode != 0:
+                raise OSError(f"Error comprimiendo el snapshot: {resultado.stderr.strip()}")
+            checksum = resultado.stdout.strip()
+
+            # Se publica al final: un snapshot visible siempre está completo
+            with open(ruta + '.sha256', 'w') as archivo:
+                archivo.write(f"{checksum}  {nombre}\n")
+            os.replace(temporal_gz, ruta)
+        finally:
+            for temporal in (temporal_db, temporal_gz):
+                if os.path.exists(temporal):
+                    os.remove(temporal)
+
+        self.limpiar_snapshots()
+        return ruta
+
+    def listar_snapshots(self):
+        """Snapshots disponibles, del más reciente al más antiguo"""
+        if not os.path.isdir(self.directorio):
+            return []
+        nombres = [n for n in os.listdir(self.directorio) if n.endswith('.db.gz')]
+        return [os.path.join(self.directorio, n) for n in sorted(nombres, reverse=True)]
+
+    def edad_ultimo_snapshot(self):
+        """Segundos desde el snapshot más reciente (de cualquier réplica); None si no hay"""
+        for ruta in self.listar_snapshots():
+            try:
+                return max(0.0, time.time() - os.path.getmtime(ruta))
+            except FileNotFoundError:
+                # Otra réplica lo borró al limpiar: se mira el siguiente
+                continue
+        return None
+
+    def limpiar_snapshots(self):
+        for ruta in self.listar_snapshots()[self.conservar:]:
+            # Varias réplicas pueden limpiar el mismo directorio a la vez
+            for archivo in (ruta, ruta + '.sha256'):
+                try:
+                    os.remove(archivo)
+                except FileNotFoundError:
+                    pass
+
+    def verificar_snapshot(self, ruta):
+        """Compara el SHA-256 del archivo comprimido con el registrado al crearlo"""
+        with open(ruta + '.sha256') as archivo:
+            esperado = archivo.read().split()[0]
+        checksum = hashlib.sha256()
+        with open(ruta, 'rb') as snapshot:
+            for bloque in iter(lambda: snapshot.read(TAMANO_BLOQUE), b''):
+                checksum.update(bloque)
+        return checksum.hexdigest() == esperado
+
+    def restaurar_snapshot(self, ruta):
+        """Reemplaza el contenido de la base por el del snapshot.
+        
+        La copia se hace con la API de backup en un solo paso, de modo que las
+        conexiones abiertas (otras sesiones y réplicas) ven la base restaurada
+        sin reiniciarse y sin arriesgar un archivo WAL inconsistente.
+        """
+        if not self.verificar_snapshot(ruta):
+            raise ValueError(f"Checksum inválido para {os.path.basename(ruta)}")
+
+        temporal_db = ruta + '.restaurar.tmp'
+        try:
+            with gzip.open(ruta, 'rb') as comprimido, open(temporal_db, 'wb') as destino:
+                shutil.copyfileobj(comprimido, destino, TAMANO_BLOQUE)
+
+            snapshot = sqlite3.connect(temporal_db)
+            try:
+                def copiar():
+                    destino = self.db.get_connection()
+                    try:
+                        snapshot.backup(destino)
+                    finally:
+                        destino.close()
+                reintentar_si_bloqueada(copiar)
+            finally:
+                snapshot.close()
+        finally:
+            if os.path.exists(temporal_db):
+                os.remove(temporal_db)
+
+class RespaldoScheduler(threading.Thread):
+    """Crea snapshots periódicos de la base en segundo plano.
+
+    El plazo se cuenta desde el snapshot más reciente del directorio, así que
+    reiniciar la app no lo pospone. Las réplicas que vencen a la vez compiten
+    por el turno de crear_snapshot: una lo crea y las demás lo omiten.
+    """
+
+    def __init__(self, respaldos, intervalo=INTERVALO_RESPALDO):
+        super().__init__(name="respaldo-scheduler", daemon=True)
+        self.respaldos = respaldos
+        self.intervalo = intervalo
+        self.ultimo_snapshot = None
+        self.ultimo_error = None
+        self.proximo = None
+        self._detener = threading.Event()
+
+    def espera_pendiente(self):
+        """Segundos hasta que toque el siguiente snapshot"""
+        edad = self.respaldos.edad_ultimo_snapshot()
+        return 0 if edad is None else max(0, self.intervalo - edad)
+
+    def run(self):
+        espera = self.espera_pendiente()
+        while True:
+            self.proximo = datetime.fromtimestamp(time.time() + espera)
+            if self._detener.wait(espera):
+                return
+            # Otra réplica (o un snapshot manual) puede haberlo creado mientras tanto
+            espera = self.espera_pendiente()
+            if espera > 0:
+                continue
+            try:
+                ruta = self.respaldos.crear_snapshot(intervalo=self.intervalo)
+            except (sqlite3.Error, OSError) as e:
+                self.ultimo_error = str(e)
+                espera = min(REINTENTO_RESPALDO, self.intervalo)
+                continue
+            if ruta is None:
+                # Otra réplica lo está creando: al volver a mirar, su snapshot fija el plazo
+                espera = min(REINTENTO_RESPALDO, self.intervalo)
+            else:
+                self.ultimo_snapshot = ruta
+                self.ultimo_error = None
+                espera = self.intervalo
+
+    def detener(self):
+        self._detener.set()
 
 class InventarioManager:
     def __init__(self, db_manager):
         self.db = db_manager
+        # Contadores de contención, útiles para diagnóstico y pruebas de carga.
+        # espera: segundos esperando el bloqueo de escritura (busy timeout de
+        # SQLite en intentos exitosos, más intentos fallidos y backoff)
+        self.estadisticas_bloqueo = {'reintentos': 0, 'espera': 0.0, 'fallos': 0}
     
-    def ejecutar_consulta(self, query, params=None, commit=False):
-        try:
+    def _con_reintentos(self, operacion):
+        """Ejecuta operacion(conn) con una conexión nueva por intento"""
+        def intento():
             conn = self.db.get_connection()
+            try:
+                return operacion(conn)
+            finally:
+                conn.close()
+        return reintentar_si_bloqueada(intento, self.estadisticas_bloqueo)
+    
+    def _tomar_bloqueo_escritura(self, cursor):
+        """Abre una transacción de escritura contando la espera interna de SQLite.
+        
+        La espera del busy timeout en intentos que sí obtienen el bloqueo no la
+        ve reintentar_si_bloqueada; se mide aquí, aparte del tiempo de ejecución.
+        """
+        inicio = time.perf_counter()
+        # IMMEDIATE toma el bloqueo de escritura al inicio: evita lecturas
+        # que luego no pueden promoverse a escritura (SQLITE_BUSY sin espera)
+        cursor.execute("BEGIN IMMEDIATE")
+        self.estadisticas_bloqueo['espera'] += time.perf_counter() - inicio
+    
+    def ejecutar_consulta(self, query, params=None, commit=False):
+        es_consulta = query.strip().upper().startswith('SELECT')
+        
+        def operacion(conn):
             cursor = conn.cursor()
+            if not es_consulta:
+                self._tomar_bloqueo_escritura(cursor)
             
             if params:
                 cursor.execute(query, params)
             else:
                 cursor.execute(query)
             
-            if query.strip().upper().startswith('SELECT'):
+            if es_consulta:
                 columns = [description[0] for description in cursor.description]
                 resultado = cursor.fetchall()
-                resultado_dict = [dict(zip(columns, row)) for row in resultado]
-                conn.close()
-                return resultado_dict
+                return [dict(zip(columns, row)) for row in resultado]
             else:
                 if commit:
                     conn.commit()
-                conn.close()
                 return True
-                
+        
+        inicio = time.perf_counter()
+        try:
+            return self._con_reintentos(operacion)
         except Exception as e:
             st.error(f"❌ Error en consulta: {e}")
             return None
+        finally:
+            if not es_consulta:
+                self.db.latencias_escritura.registrar(time.perf_counter() - inicio)
+    
+    def ejecutar_transaccion(self, operacion):
+        """Ejecuta operacion(cursor) dentro de una transacción de escritura atómica.
+        
+        Devuelve el resultado de operacion o None si la transacción falla.
+        """
+        def transaccion(conn):
+            cursor = conn.cursor()
+            self._tomar_bloqueo_escritura(cursor)
+            try:
+                resultado = operacion(cursor)
+                conn.commit()
+                return resultado
+            except Exception:
+                conn.rollback()
+                raise
+        
+        inicio = time.perf_counter()
+        try:
+            return self._con_reintentos(transaccion)
+        except Exception as e:
+            st.error(f"❌ Error en transacción: {e}")
+            return None
+        finally:
+            self.db.latencias_escritura.registrar(time.perf_counter() - inicio)
     
     def obtener_productos(self, filtro_categoria=None, filtro_estado=None, busqueda=None):
         """Obtiene productos con filtros avanzados"""
         try:
-            query = '''
-                SELECT *, 
-                       CASE 
-                           WHEN stock = 0 THEN 'SIN_STOCK'
-                           WHEN stock <= stock_minimo THEN 'STOCK_BAJO'
-                           ELSE 'STOCK_OK'
-                       END as estado_stock
-                FROM productos 
-                WHERE activo = 1
+            query = f'''
+                SELECT p.*,
+                       COALESCE(c.nombre, '') AS categoria,
+                       t.codigo AS tipo_medida,
+                       t.display AS medida_display,
+                       COALESCE(u.nombre, '') AS ubicacion,
+                       {ESTADO_STOCK_SQL.format(t='p')} AS estado_stock
+                FROM productos p
+                LEFT JOIN categorias c ON c.id = p.categoria_id
+                LEFT JOIN tipos_medida t ON t.id = p.tipo_medida_id
+                LEFT JOIN ubicaciones u ON u.id = p.ubicacion_id
+                WHERE p.activo = 1
             '''
             
             params = []
             
             # Aplicar filtros
+            # filtro_categoria es el id de categorias (usa idx_productos_categoria)
             if filtro_categoria and filtro_categoria != 'Todas':
-                query += ' AND categoria = ?'
+                query += ' AND p.categoria_id = ?'
                 params.append(filtro_categoria)
             
             if filtro_estado and filtro_estado != 'Todos':
                 if filtro_estado == 'Sin Stock':
-                    query += ' AND stock = 0'
+                    query += ' AND p.stock = 0'
                 elif filtro_estado == 'Stock Bajo':
-                    query += ' AND stock <= stock_minimo AND stock > 0'
+                    query += ' AND p.stock <= p.stock_minimo AND p.stock > 0'
                 elif filtro_estado == 'Stock OK':
-                    query += ' AND stock > stock_minimo'
+                    query += ' AND p.stock > p.stock_minimo'
             
             if busqueda:
-                query += ' AND (nombre LIKE ? OR categoria LIKE ? OR ubicacion LIKE ?)'
+                query += ' AND (p.nombre LIKE ? OR c.nombre LIKE ? OR u.nombre LIKE ?)'
                 params.extend([f'%{busqueda}%', f'%{busqueda}%', f'%{busqueda}%'])
             
-            query += ' ORDER BY nombre'
+            query += ' ORDER BY p.nombre'
             
             productos = self.ejecutar_consulta(query, params)
             
             if productos:
                 for producto in productos:
-                    producto['medida_display'] = self._obtener_medida_display(producto['tipo_medida'])
                     producto['valor_total'] = producto['stock'] * producto.get('precio_compra', 0)
                     # Calcular días de stock basado en consumo promedio
                     producto['dias_stock'] = self.calcular_dias_stock(producto['id'])
@@ -192,15 +1028,6 @@ class InventarioManager:
             st.error(f"❌ Error obteniendo productos: {e}")
             return []
     
-    def _obtener_medida_display(self, tipo_medida):
-        medidas = {
-            'UNIDAD': 'unid',
-            'KILO': 'kg',
-            'LITRO': 'lt',
-            'METRO': 'm'
-        }
-        return medidas.get(tipo_medida, 'unid')
-    
     def calcular_dias_stock(self, producto_id):
         """Calcula días aproximados de stock basado en historial"""
         try:
@@ -234,18 +1061,47 @@ class InventarioManager:
             return "N/A"
     
     def obtener_categorias(self):
-        """Obtiene categorías únicas"""
+        """Obtiene las categorías del catálogo como {id: nombre}"""
         try:
-            categorias = self.ejecutar_consulta('''
-                SELECT DISTINCT categoria 
-                FROM productos 
-                WHERE categoria IS NOT NULL AND categoria != '' 
-                ORDER BY categoria
+            categorias = self.ejecutar_consulta("SELECT id, nombre FROM categorias ORDER BY nombre")
+            return {cat['id']: cat['nombre'] for cat in categorias} if categorias else {}
+        except:
+            return {}
+
+    def obtener_productos_criticos(self):
+        """Productos críticos actuales, leídos de la tabla mantenida por triggers"""
+        try:
+            criticos = self.ejecutar_consulta('''
+                SELECT p.id, p.nombre, p.stock, p.stock_minimo,
+                       t.display AS medida_display,
+                       c.estado, datetime(c.desde, 'localtime') AS desde,
+                       s.cantidad_sugerida, s.alertas,
+                       datetime(s.primera_alerta, 'localtime') AS primera_alerta
+                FROM productos_criticos c
+                JOIN productos p ON p.id = c.producto_id
+                LEFT JOIN tipos_medida t ON t.id = p.tipo_medida_id
+                LEFT JOIN sugerencias_reposicion s ON s.producto_id = c.producto_id
+                ORDER BY c.estado = 'STOCK_BAJO', c.desde
             ''')
-            return [cat['categoria'] for cat in categorias] if categorias else []
+            return criticos or []
         except:
             return []
-    
+
+    def obtener_alertas_recientes(self, limite=10):
+        """Últimos cruces de umbral registrados por los triggers"""
+        try:
+            alertas = self.ejecutar_consulta('''
+                SELECT a.id, a.producto_id, p.nombre, a.estado_anterior, a.estado_nuevo,
+                       a.stock, a.stock_minimo, datetime(a.fecha, 'localtime') AS fecha
+                FROM alertas_stock a
+                JOIN productos p ON p.id = a.producto_id
+                ORDER BY a.id DESC
+                LIMIT ?
+            ''', (limite,))
+            return alertas or []
+        except:
+            return []
+
     def obtener_estadisticas(self, productos_filtrados=None):
         """Calcula estadísticas del inventario"""
         try:
@@ -284,12 +1140,6 @@ class InventarioManager:
     def agregar_producto(self, datos):
         """Agrega un nuevo producto"""
         try:
-            query = """
-                INSERT INTO productos (nombre, categoria, stock, stock_minimo, 
-                                     precio_compra, precio_venta, tipo_medida, ubicacion)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            """
-            
             params = (
                 datos['nombre'].strip(),
                 datos.get('categoria', ''),
@@ -301,12 +1151,18 @@ class InventarioManager:
                 datos.get('ubicacion', '')
             )
             
-            resultado = self.ejecutar_consulta(query, params, commit=True)
+            def operacion(cursor):
+                registrar_catalogos(cursor, datos.get('categoria'), datos.get('ubicacion'),
+                                    datos.get('tipo_medida'))
+                cursor.execute(SQL_INSERTAR_PRODUCTO, params)
+                # Registrar movimiento inicial en la misma transacción
+                cursor.execute(SQL_INSERTAR_MOVIMIENTO,
+                               ("ENTRADA", cursor.lastrowid, datos.get('stock', 0), "Creación de producto"))
+                return True
+            
+            resultado = self.ejecutar_transaccion(operacion)
             
             if resultado:
-                # Registrar movimiento inicial
-                producto_id = self.ejecutar_consulta("SELECT last_insert_rowid()")[0]['last_insert_rowid()']
-                self.registrar_movimiento(producto_id, "ENTRADA", datos.get('stock', 0), "Creación de producto")
                 return True, "✅ Producto agregado correctamente"
             return False, "❌ Error al agregar producto"
         except Exception as e:
@@ -317,8 +1173,11 @@ class InventarioManager:
         try:
             query = """
                 UPDATE productos 
-                SET nombre = ?, categoria = ?, stock_minimo = ?,
-                    precio_compra = ?, precio_venta = ?, tipo_medida = ?, ubicacion = ?
+                SET nombre = ?,
+                    categoria_id = (SELECT id FROM categorias WHERE nombre = ?),
+                    stock_minimo = ?, precio_compra = ?, precio_venta = ?,
+                    tipo_medida_id = COALESCE((SELECT id FROM tipos_medida WHERE codigo = ?), 1),
+                    ubicacion_id = (SELECT id FROM ubicaciones WHERE nombre = ?)
                 WHERE id = ?
             """
             
@@ -333,7 +1192,13 @@ class InventarioManager:
                 producto_id
             )
             
-            resultado = self.ejecutar_consulta(query, params, commit=True)
+            def operacion(cursor):
+                registrar_catalogos(cursor, datos.get('categoria'), datos.get('ubicacion'),
+                                    datos.get('tipo_medida'))
+                cursor.execute(query, params)
+                return True
+            
+            resultado = self.ejecutar_transaccion(operacion)
             
             if resultado:
                 return True, "✅ Producto actualizado correctamente"
@@ -359,38 +1224,38 @@ class InventarioManager:
     def ajustar_stock(self, producto_id, cantidad, tipo, motivo="Ajuste manual"):
         """Ajusta el stock de un producto"""
         try:
-            # Obtener stock actual
-            producto = self.ejecutar_consulta("SELECT stock FROM productos WHERE id = ?", (producto_id,))
-            if not producto:
-                return False, "Producto no encontrado"
-            
-            stock_actual = producto[0]['stock']
-            
-            if tipo == "ENTRADA":
-                nuevo_stock = stock_actual + cantidad
-            else:  # SALIDA
-                if stock_actual < cantidad:
-                    return False, "❌ Stock insuficiente para esta salida"
-                nuevo_stock = stock_actual - cantidad
-            
-            # Actualizar stock
-            self.ejecutar_consulta("UPDATE productos SET stock = ? WHERE id = ?", 
-                                  (nuevo_stock, producto_id), commit=True)
+            def operacion(cursor):
+                # Lectura y escritura bajo el mismo bloqueo: sin actualizaciones perdidas
+                cursor.execute("SELECT stock FROM productos WHERE id = ?", (producto_id,))
+                producto = cursor.fetchone()
+                if not producto:
+                    return False, "Producto no encontrado"
+                
+                stock_actual = producto[0]
+                
+                if tipo == "ENTRADA":
+                    nuevo_stock = stock_actual + cantidad
+                else:  # SALIDA
+                    if stock_actual < cantidad:
+                        return False, "❌ Stock insuficiente para esta salida"
+                    nuevo_stock = stock_actual - cantidad
+                
+                # Actualizar stock y registrar movimiento
+                cursor.execute("UPDATE productos SET stock = ? WHERE id = ?", (nuevo_stock, producto_id))
+                cursor.execute(SQL_INSERTAR_MOVIMIENTO, (tipo, producto_id, cantidad, motivo))
+                return True, f"✅ Stock actualizado: {nuevo_stock}"
             
-            # Registrar movimiento
-            self.registrar_movimiento(producto_id, tipo, cantidad, motivo)
-            return True, f"✅ Stock actualizado: {nuevo_stock}"
+            resultado = self.ejecutar_transaccion(operacion)
+            if resultado is None:
+                return False, "❌ Error al ajustar stock"
+            return resultado
         except Exception as e:
             return False, f"❌ Error: {e}"
     
     def registrar_movimiento(self, producto_id, tipo, cantidad, motivo):
         """Registra un movimiento en el historial"""
         try:
-            query = """
-                INSERT INTO movimientos (tipo, producto_id, cantidad, motivo)
-                VALUES (?, ?, ?, ?)
-            """
-            return self.ejecutar_consulta(query, (tipo, producto_id, cantidad, motivo), commit=True)
+            return self.ejecutar_consulta(SQL_INSERTAR_MOVIMIENTO, (tipo, producto_id, cantidad, motivo), commit=True)
         except:
             return False
 
@@ -408,8 +1273,9 @@ def mostrar_inventario(inventario):
         
         with col2:
             # Filtro por categoría
-            categorias = ['Todas'] + inventario.obtener_categorias()
-            filtro_categoria = st.selectbox("Categoría", categorias)
+            categorias = inventario.obtener_categorias()
+            filtro_categoria = st.selectbox("Categoría", ['Todas'] + list(categorias),
+                                            format_func=lambda c: categorias.get(c, c))
         
         with col3:
             # Filtro por estado de stock
@@ -691,6 +1557,115 @@ def generar_reporte_rapido(productos):
     
     st.text_area("Reporte Generado", reporte, height=300)
 
+def mostrar_dashboard(inventario):
+    st.header("📊 Dashboard")
+
+    criticos = inventario.obtener_productos_criticos()
+    sin_stock = len([p for p in criticos if p['estado'] == 'SIN_STOCK'])
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.metric("🔴 Sin Stock", sin_stock)
+    with col2:
+        st.metric("🟡 Stock Bajo", len(criticos) - sin_stock)
+
+    st.subheader("🚨 Productos Críticos")
+    if criticos:
+        df = pd.DataFrame([{
+            'Producto': p['nombre'],
+            'Estado': "🔴" if p['estado'] == 'SIN_STOCK' else "🟡",
+            'Stock': f"{p['stock']} {p['medida_display']}",
+            'Mínimo': p['stock_minimo'],
+            'Crítico desde': p['desde'],
+            'Reponer': p['cantidad_sugerida'] if p['cantidad_sugerida'] is not None else 'Pendiente',
+            'Alertas': p['alertas'] or 0
+        } for p in criticos])
+        st.dataframe(df, use_container_width=True, hide_index=True)
+    else:
+        st.success("✅ No hay productos críticos")
+
+    st.subheader("🕒 Últimos Cruces de Umbral")
+    alertas = inventario.obtener_alertas_recientes()
+    if alertas:
+        df_alertas = pd.DataFrame([{
+            'Fecha': a['fecha'],
+            'Producto': a['nombre'],
+            'Antes': a['estado_anterior'] or '—',
+            'Ahora': a['estado_nuevo'],
+            'Stock': a['stock'],
+            'Mínimo': a['stock_minimo']
+        } for a in alertas])
+        st.dataframe(df_alertas, use_container_width=True, hide_index=True)
+    else:
+        st.info("Sin alertas registradas")
+
+def mostrar_alertas_sidebar(inventario):
+    """Resumen de productos críticos en la barra lateral"""
+    criticos = inventario.obtener_productos_criticos()
+
+    st.sidebar.markdown("---")
+    st.sidebar.subheader(f"🚨 Críticos ({len(criticos)})")
+    for producto in criticos[:5]:
+        emoji = "🔴" if producto['estado'] == 'SIN_STOCK' else "🟡"
+        st.sidebar.caption(
+            f"{emoji} {producto['nombre']}: {producto['stock']} {producto['medida_display']} "
+            f"· desde {producto['desde']}"
+        )
+    if len(criticos) > 5:
+        st.sidebar.caption(f"... y {len(criticos) - 5} más en el Dashboard")
+
+def mostrar_respaldos(scheduler):
+    """Estado de los snapshots y creación manual.
+
+    La app no tiene autenticación: descargar o restaurar la base se hace
+    solo desde el servidor con mantenimiento.py.
+    """
+    respaldos = scheduler.respaldos
+    with st.expander("💾 Respaldos de la base de datos"):
+        if scheduler.ultimo_error:
+            st.error(f"❌ Falló el último snapshot automático: {scheduler.ultimo_error}")
+        if scheduler.ultimo_snapshot:
+            st.caption(f"Último snapshot automático: {os.path.basename(scheduler.ultimo_snapshot)}")
+        if scheduler.proximo:
+            st.caption(f"Próximo snapshot automático: {scheduler.proximo:%Y-%m-%d %H:%M}")
+
+        if st.button("📸 Crear snapshot ahora"):
+            with st.spinner("Creando snapshot..."):
+                try:
+                    ruta = respaldos.crear_snapshot()
+                    if ruta:
+                        st.success(f"✅ Snapshot creado: {os.path.basename(ruta)}")
+                    else:
+                        st.info("Ya hay un snapshot en curso")
+                except (sqlite3.Error, OSError) as e:
+                    st.error(f"❌ Error creando snapshot: {e}")
+
+        snapshots = respaldos.listar_snapshots()
+        if snapshots:
+            st.caption(f"{len(snapshots)} snapshots disponibles, el más reciente "
+                       f"{os.path.basename(snapshots[0])}")
+        else:
+            st.info("Sin snapshots disponibles")
+
+@st.cache_resource
+def obtener_db_manager():
+    """Un DatabaseManager por proceso: el esquema se verifica una sola vez"""
+    return DatabaseManager()
+
+@st.cache_resource
+def iniciar_respaldos_programados(_db_manager):
+    """Arranca un único RespaldoScheduler por proceso de Streamlit"""
+    scheduler = RespaldoScheduler(RespaldoManager(_db_manager))
+    scheduler.start()
+    return scheduler
+
+@st.cache_resource
+def iniciar_worker_alertas(_db_manager):
+    """Arranca un único AlertasWorker por proceso de Streamlit"""
+    worker = AlertasWorker(_db_manager)
+    worker.start()
+    return worker
+
 # ... (las otras funciones del main y navegación permanecen igual)
 
 def main():
@@ -704,14 +1679,17 @@ def main():
     
     # Inicializar sistema
     try:
-        db_manager = DatabaseManager()
+        db_manager = obtener_db_manager()
+        # No-op si ya se inicializó; reintenta si el primer intento falló
+        db_manager.init_database()
         inventario = InventarioManager(db_manager)
-        
+        iniciar_worker_alertas(db_manager)
+        scheduler_respaldos = iniciar_respaldos_programados(db_manager)
+
         # Navegación
         if menu == "📊 Dashboard":
-            # Función del dashboard (simplificada para este ejemplo)
-            st.header("📊 Dashboard")
-            st.info("Esta es una versión mejorada del sistema de inventario")
+            mostrar_dashboard(inventario)
+            mostrar_respaldos(scheduler_respaldos)
         elif menu == "📋 Inventario":
             mostrar_inventario(inventario)
         elif menu == "🛠️ Gestión":
@@ -723,6 +1701,8 @@ def main():
             st.header("⚡ Ajustes Rápidos")
             st.info("Módulo de ajustes de stock")
         
+        mostrar_alertas_sidebar(inventario)
+
         # Información en sidebar
         st.sidebar.markdown("---")
         st.sidebar.info("""
@@ -0,0 +1,169 @@
+# benchmark_respaldo.py - Impacto de los respaldos en línea sobre ajustar_stock
+"""Mide la latencia de ajustar_stock sin respaldo y mientras RespaldoManager
+crea un snapshot de una base grande.
+
+Uso:
+    python benchmark_respaldo.py --tamano-mb 2048 --hilos 4
+
+Genera (o reutiliza con --db) una base del tamaño pedido, rellenando el
+historial de movimientos, y luego informa p50/p95/p99 de ajustar_stock en
+ambas fases, la duración y velocidad del snapshot y el tiempo de restauración.
+Termina con código 1 si el p95 o el p99 con respaldo superan el sin respaldo
+en más de --max-ratio-p95 / --max-ratio-p99 veces.
+"""
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+
+from app import (DatabaseManager, InventarioManager, RespaldoManager,
+                 SQL_INSERTAR_MOVIMIENTO, SQL_INSERTAR_PRODUCTO, registrar_catalogos)
+from pruebas_carga import percentil
+
+PRODUCTOS = 1000
+LOTE_MOVIMIENTOS = 20000
+MB = 1024 * 1024
+
+
+def tamano_base(conn):
+    paginas = conn.execute("PRAGMA page_count").fetchone()[0]
+    tamano_pagina = conn.execute("PRAGMA page_size").fetchone()[0]
+    return paginas * tamano_pagina
+
+
+def preparar_base(db_manager, tamano_mb):
+    """Rellena la base con productos y movimientos hasta alcanzar tamano_mb"""
+    conn = db_manager.get_connection()
+    try:
+        if conn.execute("SELECT COUNT(*) FROM productos").fetchone()[0] < PRODUCTOS:
+            cursor = conn.cursor()
+            for i in range(PRODUCTOS):
+                categoria, ubicacion = f"Categoría {i % 25}", f"Estante {i % 40}"
+                registrar_catalogos(cursor, categoria, ubicacion)
+                cursor.execute(SQL_INSERTAR_PRODUCTO, (
+                    f"Producto {i}", categoria, 10_000, 10, 1000, 1500, 'UNIDAD', ubicacion
+                ))
+            conn.commit()
+
+        ids = [fila[0] for fila in conn.execute("SELECT id FROM productos")]
+        relleno = 'x' * 400
+        while tamano_base(conn) < tamano_mb * MB:
+            conn.executemany(SQL_INSERTAR_MOVIMIENTO, (
+                ('ENTRADA', random.choice(ids), 0, f"Relleno benchmark {relleno}")
+                for _ in range(LOTE_MOVIMIENTOS)
+            ))
+            conn.commit()
+            print(f"\r⏳ Generando base: {tamano_base(conn) / MB:,.0f} / {tamano_mb:,} MB", end='', flush=True)
+        print()
+        return ids, tamano_base(conn)
+    finally:
+        conn.close()
+
+
+def medir_ajustes(db_manager, ids, hilos, fin):
+    """Lanza hilos que ajustan stock hasta que fin esté activado; devuelve latencias"""
+    latencias = []
+    bloqueo = {'reintentos': 0, 'fallos': 0}
+
+    def sesion(semilla):
+        inventario = InventarioManager(db_manager)
+        azar = random.Random(semilla)
+        while not fin.is_set():
+            inicio = time.perf_counter()
+            inventario.ajustar_stock(azar.choice(ids), 1, azar.choice(['ENTRADA', 'SALIDA']),
+                                     "Benchmark respaldo")
+            latencias.append(time.perf_counter() - inicio)
+        bloqueo['reintentos'] += inventario.estadisticas_bloqueo['reintentos']
+        bloqueo['fallos'] += inventario.estadisticas_bloqueo['fallos']
+
+    sesiones = [threading.Thread(target=sesion, args=(i,)) for i in range(hilos)]
+    for hilo in sesiones:
+        hilo.start()
+    return sesiones, latencias, bloqueo
+
+
+def fase(db_manager, ids, hilos, tarea):
+    """Ejecuta tarea() con escritores concurrentes; devuelve (duración, latencias, bloqueo)"""
+    fin = threading.Event()
+    sesiones, latencias, bloqueo = medir_ajustes(db_manager, ids, hilos, fin)
+    inicio = time.perf_counter()
+    try:
+        tarea()
+    finally:
+        duracion = time.perf_counter() - inicio
+        fin.set()
+        for hilo in sesiones:
+            hilo.join()
+    return duracion, latencias, bloqueo
+
+
+def imprimir_fase(nombre, duracion, latencias, bloqueo):
+    print(f"{nombre:<16}{len(latencias) / duracion:>10,.1f}"
+          f"{percentil(latencias, 50) * 1000:>10.2f}"
+          f"{percentil(latencias, 95) * 1000:>10.2f}"
+          f"{percentil(latencias, 99) * 1000:>10.2f}"
+          f"{max(latencias, default=0) * 1000:>10.2f}"
+          f"{bloqueo['reintentos']:>11}{bloqueo['fallos']:>8}")
+
+
+def ejecutar_benchmark(args, directorio):
+    """Mide ambas fases, imprime el reporte y devuelve el código de salida"""
+    db_path = args.db or os.path.join(directorio, 'inventario.db')
+    db_manager = DatabaseManager(db_path)
+    ids, tamano = preparar_base(db_manager, args.tamano_mb)
+    respaldos = RespaldoManager(db_manager, directorio=os.path.join(directorio, 'respaldos'))
+
+    print(f"🚀 Base de {tamano / MB:,.0f} MB en {db_path}, {args.hilos} hilos con ajustar_stock")
+
+    sin_respaldo = fase(db_manager, ids, args.hilos, lambda: time.sleep(args.base_segundos))
+
+    snapshot = []
+    con_respaldo = fase(db_manager, ids, args.hilos, lambda: snapshot.append(respaldos.crear_snapshot()))
+
+    inicio = time.perf_counter()
+    respaldos.restaurar_snapshot(snapshot[0])
+    restauracion = time.perf_counter() - inicio
+
+    print(f"\n{'Fase':<16}{'ops/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+          f"{'máx ms':>10}{'reintentos':>11}{'fallos':>8}")
+    imprimir_fase("sin respaldo", *sin_respaldo)
+    imprimir_fase("con respaldo", *con_respaldo)
+
+    duracion_snapshot = con_respaldo[0]
+    print(f"\n💾 Snapshot: {duracion_snapshot:.1f}s ({tamano / MB / duracion_snapshot:,.1f} MB/s), "
+          f"{os.path.getsize(snapshot[0]) / MB:,.1f} MB comprimido")
+    print(f"♻️ Restauración: {restauracion:.1f}s")
+    superados = []
+    for p, maximo in ((95, args.max_ratio_p95), (99, args.max_ratio_p99)):
+        base = percentil(sin_respaldo[1], p)
+        ratio = percentil(con_respaldo[1], p) / base if base else float('inf')
+        ok = ratio <= maximo
+        print(f"{'✅' if ok else '❌'} p{p} con respaldo / sin respaldo: {ratio:.2f}x (máximo {maximo:.2f}x)")
+        if not ok:
+            superados.append(p)
+    return 1 if superados else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', help="Base a usar (por defecto una temporal que se borra al terminar)")
+    parser.add_argument('--tamano-mb', type=int, default=2048, help="Tamaño mínimo de la base")
+    parser.add_argument('--hilos', type=int, default=4, help="Sesiones ejecutando ajustar_stock")
+    parser.add_argument('--base-segundos', type=float, default=10.0,
+                        help="Duración de la medición sin respaldo")
+    parser.add_argument('--max-ratio-p95', type=float, default=1.5,
+                        help="p95 con respaldo / sin respaldo máximo admitido")
+    parser.add_argument('--max-ratio-p99', type=float, default=2.0,
+                        help="p99 con respaldo / sin respaldo máximo admitido")
+    args = parser.parse_args()
+
+    # Base (sin --db) y snapshot temporales: se borran al terminar
+    with tempfile.TemporaryDirectory(prefix='respaldo_') as directorio:
+        codigo = ejecutar_benchmark(args, directorio)
+    raise SystemExit(codigo)
+
+
+if __name__ == '__main__':
+    main()
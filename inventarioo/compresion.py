@@ -0,0 +1,59 @@
+# compresion.py - Compresión de snapshots fuera del proceso de la app
+"""Comprime una copia de la base con gzip y calcula el SHA-256 del resultado.
+
+RespaldoManager lo ejecuta como proceso aparte y con menor prioridad, para
+que la compresión no compita por CPU (ni por el GIL) con las sesiones de la
+app. No importa streamlit ni app.py.
+
+Uso:
+    python compresion.py ORIGEN DESTINO NOMBRE NIVEL PAUSA PRIORIDAD
+
+Escribe en la salida estándar el SHA-256 del archivo comprimido.
+"""
+import gzip
+import hashlib
+import os
+import sys
+import time
+
+TAMANO_BLOQUE = 1024 * 1024
+
+
+class _EscrituraConHash:
+    """Archivo de escritura que va calculando el checksum de lo escrito"""
+
+    def __init__(self, archivo, checksum):
+        self.archivo = archivo
+        self.checksum = checksum
+
+    def write(self, datos):
+        self.checksum.update(datos)
+        return self.archivo.write(datos)
+
+    def flush(self):
+        self.archivo.flush()
+
+
+def comprimir(origen, destino, nombre, nivel, pausa):
+    """Comprime origen en destino por bloques; devuelve el SHA-256 de destino"""
+    checksum = hashlib.sha256()
+    with open(origen, 'rb') as entrada, open(destino, 'wb') as salida:
+        with gzip.GzipFile(nombre, 'wb', nivel, _EscrituraConHash(salida, checksum)) as comprimido:
+            # Un bloque por paso, cediendo E/S a los escritores entre bloques
+            for bloque in iter(lambda: entrada.read(TAMANO_BLOQUE), b''):
+                comprimido.write(bloque)
+                if pausa:
+                    time.sleep(pausa)
+    return checksum.hexdigest()
+
+
+def main():
+    origen, destino, nombre, nivel, pausa, prioridad = sys.argv[1:]
+    if hasattr(os, 'nice'):
+        # En Linux la prioridad de E/S por defecto también se deriva del nice
+        os.nice(int(prioridad))
+    print(comprimir(origen, destino, nombre, int(nivel), float(pausa)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+# mantenimiento.py - Snapshots de inventario.db desde la línea de comandos
+"""Lista, crea, verifica y restaura snapshots de la base.
+
+La restauración reemplaza todo el inventario y los snapshots contienen la
+base completa (incluida la tabla de usuarios), por eso no se ofrecen en la
+interfaz web: solo quien tiene acceso al servidor puede usarlos.
+
+Uso:
+    python mantenimiento.py listar
+    python mantenimiento.py crear
+    python mantenimiento.py verificar respaldos/inventario_<fecha>.db.gz
+    python mantenimiento.py restaurar respaldos/inventario_<fecha>.db.gz --confirmar
+"""
+import argparse
+import os
+import sys
+
+from app import DIRECTORIO_RESPALDOS, DatabaseManager, RespaldoManager
+
+MB = 1024 * 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', default='inventario.db', help="Base de datos de la app")
+    parser.add_argument('--directorio', default=DIRECTORIO_RESPALDOS, help="Carpeta de snapshots")
+    comandos = parser.add_subparsers(dest='comando', required=True)
+    comandos.add_parser('listar', help="Snapshots disponibles, del más reciente al más antiguo")
+    comandos.add_parser('crear', help="Crea un snapshot ahora")
+    verificar = comandos.add_parser('verificar', help="Comprueba el checksum de un snapshot")
+    verificar.add_argument('snapshot')
+    restaurar = comandos.add_parser('restaurar', help="Reemplaza la base por el contenido de un snapshot")
+    restaurar.add_argument('snapshot')
+    restaurar.add_argument('--confirmar', action='store_true',
+                           help="Obligatorio: confirma que se reemplaza el inventario actual")
+    args = parser.parse_args()
+
+    respaldos = RespaldoManager(DatabaseManager(args.db), directorio=args.directorio)
+
+    if args.comando == 'listar':
+        for ruta in respaldos.listar_snapshots():
+            print(f"{os.path.basename(ruta)}  {os.path.getsize(ruta) / MB:,.1f} MB")
+    elif args.comando == 'crear':
+        ruta = respaldos.crear_snapshot()
+        if ruta is None:
+            sys.exit("❌ Ya hay un snapshot en curso")
+        print(f"✅ Snapshot creado: {ruta}")
+    elif args.comando == 'verificar':
+        if not respaldos.verificar_snapshot(args.snapshot):
+            sys.exit(f"❌ Checksum inválido para {args.snapshot}")
+        print(f"✅ {args.snapshot} íntegro")
+    else:
+        if not args.confirmar:
+            sys.exit("❌ Restaurar reemplaza el inventario actual: repite con --confirmar")
+        try:
+            respaldos.restaurar_snapshot(args.snapshot)
+        except ValueError as e:
+            sys.exit(f"❌ {e}")
+        print(f"✅ Base restaurada desde {args.snapshot}")
+
+
+if __name__ == '__main__':
+    main()
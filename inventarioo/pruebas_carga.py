@@ -0,0 +1,239 @@
+# pruebas_carga.py - Pruebas de carga y contención sobre inventario.db
+"""Simula varias réplicas de la app (procesos) con muchas sesiones (hilos)
+trabajando contra una misma base SQLite.
+
+Uso:
+    python pruebas_carga.py --procesos 4 --hilos 8 --duracion 30
+
+Informa throughput, latencias p50/p95/p99 por operación, reintentos y
+tiempo de espera por bloqueos, y verifica al final que el stock de cada
+producto coincida con su historial de movimientos.
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+
+from app import DatabaseManager, InventarioManager
+
+OPERACIONES = ['leer', 'buscar', 'ajustar', 'agregar']
+BUSQUEDAS = ['Arroz', 'Leche', 'Limpieza', 'Estante', 'Carga', 'zzz']
+
+
+def percentil(valores, p):
+    """Percentil p (0-100) por rango más cercano de una lista de valores"""
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    indice = max(0, min(len(ordenados) - 1, round(p / 100 * len(ordenados)) - 1))
+    return ordenados[indice]
+
+
+def ejecutar_sesion(db_manager, proceso, hilo, fin, proporcion_escritura, resultado):
+    """Bucle de una sesión: mezcla lecturas y escrituras hasta el instante fin"""
+    inventario = InventarioManager(db_manager)
+    azar = random.Random(f"{proceso}-{hilo}")
+    latencias = {op: [] for op in OPERACIONES}
+    esperas = {op: [] for op in OPERACIONES}
+    errores = {op: 0 for op in OPERACIONES}
+    rechazos = 0
+    contador = 0
+
+    productos = [p['id'] for p in inventario.ejecutar_consulta("SELECT id FROM productos") or []]
+
+    while time.perf_counter() < fin:
+        if azar.random() < proporcion_escritura:
+            op = 'agregar' if azar.random() < 0.1 else 'ajustar'
+        else:
+            op = 'buscar' if azar.random() < 0.5 else 'leer'
+
+        inicio = time.perf_counter()
+        fallos_previos = inventario.estadisticas_bloqueo['fallos']
+        espera_previa = inventario.estadisticas_bloqueo['espera']
+        if op == 'leer':
+            inventario.obtener_productos()
+            ok = True
+        elif op == 'buscar':
+            inventario.obtener_productos(busqueda=azar.choice(BUSQUEDAS))
+            ok = True
+        elif op == 'ajustar':
+            tipo = azar.choice(['ENTRADA', 'SALIDA'])
+            ok, mensaje = inventario.ajustar_stock(
+                azar.choice(productos), azar.randint(1, 5), tipo, "Prueba de carga"
+            )
+            if not ok and 'insuficiente' in mensaje:
+                rechazos += 1
+                ok = True
+        else:
+            contador += 1
+            ok, _ = inventario.agregar_producto({
+                'nombre': f"Carga p{proceso}-h{hilo}-{contador}",
+                'categoria': 'Carga',
+                'stock': azar.randint(0, 20),
+                'stock_minimo': 5,
+            })
+        latencias[op].append(time.perf_counter() - inicio)
+        esperas[op].append(inventario.estadisticas_bloqueo['espera'] - espera_previa)
+
+        if not ok or inventario.estadisticas_bloqueo['fallos'] > fallos_previos:
+            errores[op] += 1
+
+    resultado.append({
+        'latencias': latencias,
+        'esperas': esperas,
+        'errores': errores,
+        'rechazos': rechazos,
+        'bloqueo': dict(inventario.estadisticas_bloqueo),
+    })
+
+
+def ejecutar_proceso(db_path, proceso, hilos, duracion, proporcion_escritura, cola):
+    """Una réplica de la app: lanza sus sesiones como hilos y agrega resultados"""
+    fin = time.perf_counter() + duracion
+    # Como en la app: un DatabaseManager por proceso, compartido por sus sesiones
+    db_manager = DatabaseManager(db_path)
+    resultados = []
+    sesiones = [
+        threading.Thread(
+            target=ejecutar_sesion,
+            args=(db_manager, proceso, hilo, fin, proporcion_escritura, resultados)
+        )
+        for hilo in range(hilos)
+    ]
+    for sesion in sesiones:
+        sesion.start()
+    for sesion in sesiones:
+        sesion.join()
+    cola.put(resultados)
+
+
+def capturar_estado(db_path):
+    """Stock por producto y último movimiento antes de la carga"""
+    conn = sqlite3.connect(db_path)
+    try:
+        stock = dict(conn.execute("SELECT id, stock FROM productos"))
+        ultimo_movimiento = conn.execute("SELECT COALESCE(MAX(id), 0) FROM movimientos").fetchone()[0]
+        return stock, ultimo_movimiento
+    finally:
+        conn.close()
+
+
+def verificar_consistencia(db_path, stock_inicial, ultimo_movimiento):
+    """Compara el stock final con stock inicial + movimientos registrados durante la carga"""
+    conn = sqlite3.connect(db_path)
+    try:
+        neto = dict(conn.execute('''
+            SELECT producto_id,
+                   SUM(CASE WHEN tipo = 'ENTRADA' THEN cantidad ELSE -cantidad END)
+            FROM movimientos
+            WHERE id > ?
+            GROUP BY producto_id
+        ''', (ultimo_movimiento,)))
+        inconsistentes = []
+        for producto_id, stock in conn.execute("SELECT id, stock FROM productos"):
+            esperado = stock_inicial.get(producto_id, 0) + neto.get(producto_id, 0)
+            if stock != esperado or stock < 0:
+                inconsistentes.append((producto_id, esperado, stock))
+        return inconsistentes
+    finally:
+        conn.close()
+
+
+def imprimir_reporte(sesiones, duracion, inconsistentes):
+    latencias = {op: [] for op in OPERACIONES}
+    esperas = {op: [] for op in OPERACIONES}
+    errores = {op: 0 for op in OPERACIONES}
+    reintentos = fallos = rechazos = 0
+    espera = 0.0
+    for sesion in sesiones:
+        for op in OPERACIONES:
+            latencias[op].extend(sesion['latencias'][op])
+            esperas[op].extend(sesion['esperas'][op])
+            errores[op] += sesion['errores'][op]
+        reintentos += sesion['bloqueo']['reintentos']
+        fallos += sesion['bloqueo']['fallos']
+        espera += sesion['bloqueo']['espera']
+        rechazos += sesion['rechazos']
+
+    total = sum(len(v) for v in latencias.values())
+    print(f"\n📊 Operaciones: {total} en {duracion:.1f}s → {total / duracion:,.1f} ops/s")
+    print(f"{'Operación':<10}{'Total':>8}{'Errores':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+          f"{'bloqueo p95':>13}{'ejecución p95':>15}")
+    for op in OPERACIONES:
+        valores = latencias[op]
+        # Latencia separada en espera por el bloqueo de escritura y ejecución
+        ejecucion = [total - espera for total, espera in zip(valores, esperas[op])]
+        print(f"{op:<10}{len(valores):>8}{errores[op]:>9}"
+              f"{percentil(valores, 50) * 1000:>10.2f}"
+              f"{percentil(valores, 95) * 1000:>10.2f}"
+              f"{percentil(valores, 99) * 1000:>10.2f}"
+              f"{percentil(esperas[op], 95) * 1000:>13.2f}"
+              f"{percentil(ejecucion, 95) * 1000:>15.2f}")
+
+    print(f"\n🔒 Reintentos por bloqueo: {reintentos}")
+    print(f"🔒 Tiempo en espera por bloqueo: {espera:.2f}s")
+    print(f"🔒 Operaciones que agotaron los reintentos: {fallos}")
+    print(f"🚫 Salidas rechazadas por stock insuficiente: {rechazos}")
+
+    if inconsistentes:
+        print(f"\n❌ Libro de movimientos inconsistente en {len(inconsistentes)} productos:")
+        for producto_id, esperado, stock in inconsistentes[:10]:
+            print(f"   producto {producto_id}: esperado {esperado}, stock {stock}")
+    else:
+        print("\n✅ Stock consistente con el historial de movimientos")
+
+
+def ejecutar_carga(args, db_path):
+    """Lanza las réplicas contra db_path, imprime el reporte y devuelve el código de salida"""
+    DatabaseManager(db_path)
+    stock_inicial, ultimo_movimiento = capturar_estado(db_path)
+
+    print(f"🚀 {args.procesos} procesos × {args.hilos} hilos durante {args.duracion}s sobre {db_path}")
+    cola = multiprocessing.Queue()
+    procesos = [
+        multiprocessing.Process(
+            target=ejecutar_proceso,
+            args=(db_path, proceso, args.hilos, args.duracion, args.escrituras, cola)
+        )
+        for proceso in range(args.procesos)
+    ]
+    inicio = time.perf_counter()
+    for proceso in procesos:
+        proceso.start()
+    sesiones = []
+    for _ in procesos:
+        sesiones.extend(cola.get())
+    for proceso in procesos:
+        proceso.join()
+    duracion = time.perf_counter() - inicio
+
+    inconsistentes = verificar_consistencia(db_path, stock_inicial, ultimo_movimiento)
+    imprimir_reporte(sesiones, duracion, inconsistentes)
+    return 1 if inconsistentes or any(s['bloqueo']['fallos'] for s in sesiones) else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', help="Base a usar (por defecto una temporal que se borra al terminar)")
+    parser.add_argument('--procesos', type=int, default=4)
+    parser.add_argument('--hilos', type=int, default=8, help="Sesiones por proceso")
+    parser.add_argument('--duracion', type=float, default=10.0, help="Segundos de carga")
+    parser.add_argument('--escrituras', type=float, default=0.3,
+                        help="Proporción de operaciones de escritura (0-1)")
+    args = parser.parse_args()
+
+    if args.db:
+        codigo = ejecutar_carga(args, args.db)
+    else:
+        # Base temporal: se borra al terminar junto con su WAL
+        with tempfile.TemporaryDirectory(prefix='carga_') as directorio:
+            codigo = ejecutar_carga(args, os.path.join(directorio, 'inventario.db'))
+    raise SystemExit(codigo)
+
+
+if __name__ == '__main__':
+    main()
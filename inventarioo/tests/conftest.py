@@ -0,0 +1,5 @@
+import os
+import sys
+
+# app.py vive en la raíz de inventarioo/, no es un paquete instalable
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,127 @@
+"""Cruces de umbral registrados por triggers y consolidados por AlertasWorker"""
+import sqlite3
+
+import pytest
+
+from app import AlertasWorker, DatabaseManager, InventarioManager
+
+
+@pytest.fixture
+def sistema(tmp_path):
+    db_manager = DatabaseManager(str(tmp_path / 'inventario.db'))
+    inventario = InventarioManager(db_manager)
+    worker = AlertasWorker(db_manager)
+    ok, _ = inventario.agregar_producto({'nombre': 'Levadura', 'stock': 20, 'stock_minimo': 5})
+    assert ok
+    producto_id = inventario.obtener_productos(busqueda='Levadura')[0]['id']
+    return db_manager, inventario, worker, producto_id
+
+
+def critico(inventario, producto_id):
+    return next((p for p in inventario.obtener_productos_criticos() if p['id'] == producto_id), None)
+
+
+def ejecutar(db_manager, sql, params=()):
+    conn = sqlite3.connect(db_manager.db_path)
+    try:
+        resultado = conn.execute(sql, params).fetchall()
+        conn.commit()
+        return resultado
+    finally:
+        conn.close()
+
+
+def test_cruce_a_stock_bajo_genera_sugerencia(sistema):
+    db_manager, inventario, worker, producto_id = sistema
+    assert critico(inventario, producto_id) is None
+
+    inventario.ajustar_stock(producto_id, 17, 'SALIDA')
+    pendiente = critico(inventario, producto_id)
+    assert pendiente['estado'] == 'STOCK_BAJO'
+    assert pendiente['cantidad_sugerida'] is None
+
+    assert worker.procesar_alertas() == 1
+    sugerido = critico(inventario, producto_id)
+    assert sugerido['cantidad_sugerida'] == 5 * 2 - 3
+    assert sugerido['alertas'] == 1
+    assert worker.procesar_alertas() == 0
+
+
+def test_desde_se_conserva_al_pasar_a_sin_stock(sistema):
+    db_manager, inventario, worker, producto_id = sistema
+    inventario.ajustar_stock(producto_id, 17, 'SALIDA')
+    ejecutar(db_manager, "UPDATE productos_criticos SET desde = '2020-01-01 00:00:00' WHERE producto_id = ?",
+             (producto_id,))
+
+    inventario.ajustar_stock(producto_id, 3, 'SALIDA')
+    worker.procesar_alertas()
+
+    producto = critico(inventario, producto_id)
+    assert producto['estado'] == 'SIN_STOCK'
+    assert ejecutar(db_manager, "SELECT desde FROM productos_criticos WHERE producto_id = ?",
+                    (producto_id,)) == [('2020-01-01 00:00:00',)]
+    assert producto['alertas'] == 2
+
+
+def test_recuperacion_borra_critico_y_sugerencia(sistema):
+    db_manager, inventario, worker, producto_id = sistema
+    inventario.ajustar_stock(producto_id, 17, 'SALIDA')
+    worker.procesar_alertas()
+
+    inventario.ajustar_stock(producto_id, 10, 'ENTRADA')
+    assert critico(inventario, producto_id) is None
+    worker.procesar_alertas()
+    assert ejecutar(db_manager, "SELECT * FROM sugerencias_reposicion WHERE producto_id = ?",
+                    (producto_id,)) == []
+
+    estados = [(a['estado_anterior'], a['estado_nuevo']) for a in inventario.obtener_alertas_recientes()
+               if a['producto_id'] == producto_id]
+    assert estados == [('STOCK_BAJO', 'STOCK_OK'), ('STOCK_OK', 'STOCK_BAJO')]
+
+
+def test_cambio_de_minimo_cruza_umbral(sistema):
+    db_manager, inventario, worker, producto_id = sistema
+    ok, _ = inventario.actualizar_producto(producto_id, {'nombre': 'Levadura', 'stock_minimo': 25})
+    assert ok
+    worker.procesar_alertas()
+    assert critico(inventario, producto_id)['cantidad_sugerida'] == 25 * 2 - 20
+
+
+def test_baja_de_producto_quita_critico_y_sugerencia(sistema):
+    db_manager, inventario, worker, producto_id = sistema
+    inventario.ajustar_stock(producto_id, 20, 'SALIDA')
+    worker.procesar_alertas()
+
+    ok, _ = inventario.eliminar_producto(producto_id)
+    assert ok
+    assert critico(inventario, producto_id) is None
+    assert ejecutar(db_manager, "SELECT * FROM sugerencias_reposicion WHERE producto_id = ?",
+                    (producto_id,)) == []
+
+
+def test_sugerencia_se_refresca_sin_cruzar_umbral(sistema):
+    db_manager, inventario, worker, producto_id = sistema
+    inventario.ajustar_stock(producto_id, 16, 'SALIDA')
+    worker.procesar_alertas()
+    assert critico(inventario, producto_id)['cantidad_sugerida'] == 5 * 2 - 4
+
+    # Sigue en STOCK_BAJO: no hay alerta nueva, pero la cantidad sugerida cambia
+    inventario.ajustar_stock(producto_id, 2, 'SALIDA')
+    assert worker.procesar_alertas() == 0
+    producto = critico(inventario, producto_id)
+    assert producto['cantidad_sugerida'] == 5 * 2 - 2
+    assert producto['alertas'] == 1
+
+
+def test_alertas_procesadas_antiguas_se_purgan(sistema):
+    db_manager, inventario, worker, producto_id = sistema
+    inventario.ajustar_stock(producto_id, 17, 'SALIDA')
+    worker.procesar_alertas()
+    ejecutar(db_manager, "UPDATE alertas_stock SET fecha = datetime('now', '-31 days') WHERE producto_id = ?",
+             (producto_id,))
+
+    inventario.ajustar_stock(producto_id, 3, 'SALIDA')
+    worker.procesar_alertas()
+
+    assert ejecutar(db_manager, "SELECT estado_nuevo, procesada FROM alertas_stock WHERE producto_id = ?",
+                    (producto_id,)) == [('SIN_STOCK', 1)]
@@ -0,0 +1,106 @@
+"""Reintentos ante una base bloqueada y consistencia bajo carga concurrente"""
+import multiprocessing
+import sqlite3
+import threading
+import time
+
+import pytest
+
+import app
+import pruebas_carga
+from app import DatabaseManager, InventarioManager
+
+
+@pytest.fixture
+def inventario(tmp_path):
+    return InventarioManager(DatabaseManager(str(tmp_path / 'inventario.db')))
+
+
+def bloquear_escritura(db_path, segundos):
+    """Mantiene BEGIN IMMEDIATE en otra conexión durante segundos; devuelve el hilo"""
+    tomado = threading.Event()
+
+    def mantener():
+        conn = sqlite3.connect(db_path, isolation_level=None)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            tomado.set()
+            time.sleep(segundos)
+            conn.execute("ROLLBACK")
+        finally:
+            conn.close()
+
+    hilo = threading.Thread(target=mantener)
+    hilo.start()
+    tomado.wait()
+    return hilo
+
+
+def stock(inventario, producto_id):
+    return next(p['stock'] for p in inventario.obtener_productos() if p['id'] == producto_id)
+
+
+def test_espera_breve_se_cuenta_sin_reintentar(inventario):
+    producto_id = inventario.obtener_productos()[0]['id']
+    hilo = bloquear_escritura(inventario.db.db_path, 0.2)
+
+    ok, _ = inventario.ajustar_stock(producto_id, 1, 'ENTRADA')
+    hilo.join()
+
+    assert ok
+    assert inventario.estadisticas_bloqueo['reintentos'] == 0
+    assert inventario.estadisticas_bloqueo['espera'] >= 0.1
+
+
+def test_bloqueo_mas_largo_que_el_timeout_se_reintenta(inventario, monkeypatch):
+    monkeypatch.setattr(app, 'TIMEOUT_CONEXION', 0.1)
+    producto_id = inventario.obtener_productos()[0]['id']
+    antes = stock(inventario, producto_id)
+    hilo = bloquear_escritura(inventario.db.db_path, 0.3)
+
+    ok, _ = inventario.ajustar_stock(producto_id, 1, 'ENTRADA')
+    hilo.join()
+
+    assert ok
+    assert stock(inventario, producto_id) == antes + 1
+    assert inventario.estadisticas_bloqueo['reintentos'] >= 1
+    assert inventario.estadisticas_bloqueo['espera'] >= 0.2
+    assert inventario.estadisticas_bloqueo['fallos'] == 0
+
+
+def test_reintentos_agotados_cuentan_como_fallo(inventario, monkeypatch):
+    monkeypatch.setattr(app, 'TIMEOUT_CONEXION', 0.05)
+    monkeypatch.setattr(app, 'MAX_REINTENTOS', 2)
+    producto_id = inventario.obtener_productos()[0]['id']
+    antes = stock(inventario, producto_id)
+    hilo = bloquear_escritura(inventario.db.db_path, 1.0)
+
+    ok, _ = inventario.ajustar_stock(producto_id, 1, 'ENTRADA')
+    hilo.join()
+
+    assert not ok
+    assert stock(inventario, producto_id) == antes
+    assert inventario.estadisticas_bloqueo['reintentos'] == 2
+    assert inventario.estadisticas_bloqueo['fallos'] == 1
+
+
+def test_carga_concurrente_mantiene_el_libro_consistente(tmp_path):
+    db_path = str(tmp_path / 'inventario.db')
+    DatabaseManager(db_path)
+    stock_inicial, ultimo_movimiento = pruebas_carga.capturar_estado(db_path)
+
+    cola = multiprocessing.Queue()
+    procesos = [
+        multiprocessing.Process(target=pruebas_carga.ejecutar_proceso,
+                                args=(db_path, proceso, 4, 1.0, 0.5, cola))
+        for proceso in range(2)
+    ]
+    for proceso in procesos:
+        proceso.start()
+    sesiones = [sesion for _ in procesos for sesion in cola.get(timeout=60)]
+    for proceso in procesos:
+        proceso.join()
+
+    assert sum(len(v) for s in sesiones for v in s['latencias'].values()) > 0
+    assert not any(s['bloqueo']['fallos'] for s in sesiones)
+    assert pruebas_carga.verificar_consistencia(db_path, stock_inicial, ultimo_movimiento) == []
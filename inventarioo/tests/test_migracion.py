@@ -0,0 +1,119 @@
+"""Migración de una base con el esquema original (catálogos como texto)"""
+import sqlite3
+
+import pytest
+
+from app import VERSION_ESQUEMA, DatabaseManager, InventarioManager
+
+ESQUEMA_ORIGINAL = '''
+    CREATE TABLE productos (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        nombre TEXT NOT NULL,
+        categoria TEXT,
+        stock INTEGER NOT NULL DEFAULT 0,
+        stock_minimo INTEGER NOT NULL DEFAULT 0,
+        precio_compra REAL DEFAULT 0,
+        precio_venta REAL DEFAULT 0,
+        tipo_medida TEXT DEFAULT 'UNIDAD',
+        ubicacion TEXT,
+        activo BOOLEAN DEFAULT 1,
+        fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE TABLE movimientos (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        tipo TEXT NOT NULL CHECK(tipo IN ('ENTRADA', 'SALIDA')),
+        producto_id INTEGER NOT NULL,
+        cantidad INTEGER NOT NULL,
+        motivo TEXT,
+        usuario TEXT NOT NULL DEFAULT 'sistema',
+        fecha TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (producto_id) REFERENCES productos (id)
+    );
+'''
+
+PRODUCTOS_ORIGINALES = [
+    (1, 'Arroz Integral', 'Granos', 50, 10, 'KILO', 'Estante A-1', 1),
+    (2, 'Leche Descremada', 'Lácteos', 3, 5, 'LITRO', 'Refrigerador B-2', 1),
+    (4, 'Cajas de Cartón', '', 0, 2, 'CAJA', None, 1),
+    (5, 'Producto Retirado', 'Granos', 1, 5, 'UNIDAD', 'Estante A-1', 0),
+]
+
+
+@pytest.fixture
+def base_original(tmp_path):
+    ruta = str(tmp_path / 'inventario.db')
+    conn = sqlite3.connect(ruta)
+    conn.executescript(ESQUEMA_ORIGINAL)
+    conn.executemany('''
+        INSERT INTO productos (id, nombre, categoria, stock, stock_minimo, tipo_medida, ubicacion, activo)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', PRODUCTOS_ORIGINALES)
+    # El id 6 existió y se borró: el siguiente producto debe seguir siendo el 7
+    conn.execute("INSERT INTO productos (id, nombre) VALUES (6, 'Borrado')")
+    conn.execute("DELETE FROM productos WHERE id = 6")
+    conn.commit()
+    conn.close()
+    return ruta
+
+
+def test_migracion_conserva_ids_y_secuencia(base_original):
+    DatabaseManager(base_original)
+
+    conn = sqlite3.connect(base_original)
+    columnas = [c[1] for c in conn.execute("PRAGMA table_info(productos)")]
+    assert 'categoria' not in columnas and 'categoria_id' in columnas
+    assert [r[0] for r in conn.execute("SELECT id FROM productos ORDER BY id")] == [1, 2, 4, 5]
+    assert conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'productos'").fetchone() == (6,)
+    assert conn.execute("PRAGMA user_version").fetchone() == (VERSION_ESQUEMA,)
+    conn.close()
+
+    inventario = InventarioManager(DatabaseManager(base_original))
+    ok, _ = inventario.agregar_producto({'nombre': 'Nuevo', 'categoria': 'Granos'})
+    assert ok
+    assert [p['id'] for p in inventario.obtener_productos(busqueda='Nuevo')] == [7]
+
+
+def test_migracion_traduce_catalogos(base_original):
+    inventario = InventarioManager(DatabaseManager(base_original))
+    productos = {p['id']: p for p in inventario.obtener_productos()}
+
+    assert productos[1]['categoria'] == 'Granos'
+    assert productos[1]['tipo_medida'] == 'KILO'
+    assert productos[1]['medida_display'] == 'kg'
+    assert productos[1]['ubicacion'] == 'Estante A-1'
+    # Sin categoría ni ubicación: cadena vacía como antes; medida desconocida conservada
+    assert productos[4]['categoria'] == ''
+    assert productos[4]['ubicacion'] == ''
+    assert productos[4]['tipo_medida'] == 'CAJA'
+    assert productos[4]['medida_display'] == 'unid'
+
+    # Las altas posteriores siguen la misma regla para medidas desconocidas
+    ok, _ = inventario.agregar_producto({'nombre': 'Bolsa', 'tipo_medida': 'PAQUETE'})
+    assert ok
+    bolsa = inventario.obtener_productos(busqueda='Bolsa')[0]
+    assert (bolsa['tipo_medida'], bolsa['medida_display'], bolsa['categoria']) == ('PAQUETE', 'unid', '')
+
+    categorias = inventario.obtener_categorias()
+    assert sorted(categorias.values()) == ['Granos', 'Lácteos']
+    granos = next(i for i, nombre in categorias.items() if nombre == 'Granos')
+    assert [p['id'] for p in inventario.obtener_productos(filtro_categoria=granos)] == [1]
+
+
+def test_migracion_recrea_triggers_de_alertas(base_original):
+    db = DatabaseManager(base_original)
+    inventario = InventarioManager(db)
+
+    conn = sqlite3.connect(base_original)
+    triggers = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")}
+    assert triggers == {'trg_alerta_stock_insert', 'trg_alerta_stock_update', 'trg_alerta_stock_baja'}
+    # Los críticos previos (activos) se siembran con su alerta inicial
+    assert dict(conn.execute("SELECT producto_id, estado FROM productos_criticos")) == {
+        2: 'STOCK_BAJO', 4: 'SIN_STOCK'
+    }
+    assert conn.execute("SELECT COUNT(*) FROM alertas_stock WHERE estado_anterior IS NULL").fetchone() == (2,)
+    conn.close()
+
+    ok, _ = inventario.ajustar_stock(1, 45, 'SALIDA')
+    assert ok
+    criticos = {p['id']: p['estado'] for p in inventario.obtener_productos_criticos()}
+    assert criticos[1] == 'STOCK_BAJO'
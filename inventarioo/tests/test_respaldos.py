@@ -0,0 +1,117 @@
+"""Snapshots comprimidos, limpieza y plazo del respaldo programado"""
+import os
+import sqlite3
+import threading
+import time
+
+from app import DatabaseManager, InventarioManager, RespaldoManager, RespaldoScheduler
+
+
+def crear_respaldos(tmp_path, **opciones):
+    db_manager = DatabaseManager(str(tmp_path / 'inventario.db'))
+    return RespaldoManager(db_manager, directorio=str(tmp_path / 'respaldos'), **opciones)
+
+
+def test_snapshot_se_verifica_y_restaura(tmp_path):
+    respaldos = crear_respaldos(tmp_path)
+    inventario = InventarioManager(respaldos.db)
+    producto_id = inventario.obtener_productos()[0]['id']
+    stock = inventario.obtener_productos()[0]['stock']
+
+    ruta = respaldos.crear_snapshot()
+    assert respaldos.verificar_snapshot(ruta)
+    assert respaldos.edad_ultimo_snapshot() < 60
+
+    inventario.ajustar_stock(producto_id, 1, 'ENTRADA', "Después del snapshot")
+    respaldos.restaurar_snapshot(ruta)
+
+    conn = sqlite3.connect(respaldos.db.db_path)
+    try:
+        assert conn.execute("SELECT stock FROM productos WHERE id = ?", (producto_id,)).fetchone()[0] == stock
+    finally:
+        conn.close()
+
+
+def test_snapshot_alterado_no_se_restaura(tmp_path):
+    respaldos = crear_respaldos(tmp_path)
+    ruta = respaldos.crear_snapshot()
+    with open(ruta, 'ab') as archivo:
+        archivo.write(b'x')
+    assert not respaldos.verificar_snapshot(ruta)
+
+
+def test_limpieza_tolera_archivos_ya_borrados(tmp_path, monkeypatch):
+    respaldos = crear_respaldos(tmp_path, conservar=1)
+    antiguo = respaldos.crear_snapshot()
+    reciente = respaldos.crear_snapshot()
+    assert respaldos.listar_snapshots() == [reciente]
+
+    # Otra réplica borró el snapshot entre el listado y la limpieza
+    monkeypatch.setattr(respaldos, 'listar_snapshots', lambda: [reciente, antiguo])
+    respaldos.limpiar_snapshots()
+
+
+def test_plazo_se_cuenta_desde_el_ultimo_snapshot(tmp_path):
+    respaldos = crear_respaldos(tmp_path)
+    scheduler = RespaldoScheduler(respaldos, intervalo=3600)
+    assert scheduler.espera_pendiente() == 0
+
+    ruta = respaldos.crear_snapshot()
+    hace_media_hora = time.time() - 1800
+    os.utime(ruta, (hace_media_hora, hace_media_hora))
+    assert 1700 < scheduler.espera_pendiente() <= 1800
+
+
+def test_marca_de_respaldo_suspende_el_autocheckpoint(tmp_path):
+    respaldos = crear_respaldos(tmp_path)
+    db_manager = respaldos.db
+
+    def autocheckpoint():
+        conn = db_manager.get_connection()
+        try:
+            return conn.execute("PRAGMA wal_autocheckpoint").fetchone()[0]
+        finally:
+            conn.close()
+
+    assert autocheckpoint() > 0
+    respaldos._marcar_respaldo()
+    assert autocheckpoint() == 0
+
+    # Una marca abandonada (respaldo interrumpido) deja de tener efecto
+    antigua = time.time() - 3600
+    os.utime(db_manager.marca_respaldo, (antigua, antigua))
+    assert autocheckpoint() > 0
+
+    respaldos.respaldar(str(tmp_path / 'copia.db'))
+    assert not os.path.exists(db_manager.marca_respaldo)
+
+
+def test_un_snapshot_a_la_vez_en_el_mismo_directorio(tmp_path):
+    primera = crear_respaldos(tmp_path)
+    segunda = RespaldoManager(DatabaseManager(primera.db.db_path), directorio=primera.directorio)
+
+    # Mientras una réplica tiene el turno, la otra omite su snapshot
+    turno = primera._tomar_turno()
+    assert segunda.crear_snapshot() is None
+    turno.close()
+    assert segunda.crear_snapshot() is not None
+
+
+def test_replicas_que_vencen_a_la_vez_crean_un_solo_snapshot(tmp_path):
+    primera = crear_respaldos(tmp_path)
+    managers = [primera] + [
+        RespaldoManager(DatabaseManager(primera.db.db_path), directorio=primera.directorio)
+        for _ in range(3)
+    ]
+    resultados = []
+    hilos = [
+        threading.Thread(target=lambda m=m: resultados.append(m.crear_snapshot(intervalo=3600)))
+        for m in managers
+    ]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+    assert len([r for r in resultados if r]) == 1
+    assert len(primera.listar_snapshots()) == 1